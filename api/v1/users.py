@@ -31,6 +31,34 @@ class UserResponse(BaseModel):
     enabled: bool
 
 
+class RoleReconcileBody(BaseModel):
+    desired: Dict[str, List[str]] = Field(
+        ..., description="Desired realm roles keyed by Keycloak user ID"
+    )
+    managed_roles: Optional[List[str]] = Field(
+        default=None,
+        description="Roles this call may add or remove; defaults to every role in `desired`",
+    )
+    dry_run: bool = False
+
+
+class RoleReconcileResult(BaseModel):
+    user_id: str
+    added: List[str] = Field(
+        ..., description="Roles added, or to be added on a dry run; only confirmed changes otherwise"
+    )
+    removed: List[str] = Field(
+        ..., description="Roles removed, or to be removed on a dry run; only confirmed changes otherwise"
+    )
+    status: str = Field(..., pattern="^(unchanged|planned|applied|partial|error)$")
+    error: Optional[str] = None
+
+
+class RoleReconcileResponse(BaseModel):
+    dry_run: bool
+    results: List[RoleReconcileResult]
+
+
 def get_admin_client() -> KeycloakAdminClient:
     return KeycloakAdminClient()
 
@@ -84,3 +112,16 @@ async def list_users(
 async def get_user(user_id: str, kc: KeycloakAdminClient = Depends(get_admin_client)) -> Dict[str, Any]:
     return await kc.get_user(user_id)
 
+
+@router.post(
+    "/role-mappings/reconcile",
+    response_model=RoleReconcileResponse,
+    summary="Reconcile realm role mappings for many users",
+)
+async def reconcile_role_mappings(
+    payload: RoleReconcileBody, kc: KeycloakAdminClient = Depends(get_admin_client)
+) -> Dict[str, Any]:
+    results = await kc.reconcile_realm_roles(
+        payload.desired, managed_roles=payload.managed_roles, dry_run=payload.dry_run
+    )
+    return {"dry_run": payload.dry_run, "results": results}
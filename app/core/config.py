@@ -1,9 +1,23 @@
 from functools import lru_cache
+from typing import Dict, List, Literal
 
-from pydantic import AnyHttpUrl, Field, SecretStr
+from pydantic import AnyHttpUrl, BaseModel, Field, SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+class TrustedIssuer(BaseModel):
+    """A Keycloak realm whose access tokens the service accepts."""
+
+    issuer: str
+    audience: str | None = None  # defaults to Settings.resolved_audience
+    algorithms: List[str] = Field(default_factory=lambda: ["RS256"])
+    jwks_url: str | None = None  # defaults to the realm's OIDC certs endpoint
+
+    @property
+    def resolved_jwks_url(self) -> str:
+        return self.jwks_url or f"{self.issuer}/protocol/openid-connect/certs"
+
+
 class Settings(BaseSettings):
     """Application configuration sourced from environment variables or .env."""
 
@@ -22,6 +36,34 @@ class Settings(BaseSettings):
         default=None, validation_alias="KEYCLOAK_AUDIENCE"
     )  # defaults to client id at runtime
     jwks_cache_ttl: int = Field(default=300, validation_alias="KEYCLOAK_JWKS_CACHE_TTL")
+    keycloak_trusted_issuers: List[TrustedIssuer] = Field(
+        default_factory=list, validation_alias="KEYCLOAK_TRUSTED_ISSUERS"
+    )  # JSON list; empty means only the realm configured above
+    token_verify_executor: Literal["inline", "thread", "process"] = Field(
+        default="inline", validation_alias="TOKEN_VERIFY_EXECUTOR"
+    )
+    token_verify_workers: int = Field(
+        default=4, ge=1, validation_alias="TOKEN_VERIFY_WORKERS"
+    )
+    token_verify_inline_max_bytes: int = Field(
+        default=0, ge=0, validation_alias="TOKEN_VERIFY_INLINE_MAX_BYTES"
+    )  # tokens up to this size skip the pool
+    token_max_bytes: int = Field(
+        default=8192, ge=0, validation_alias="TOKEN_MAX_BYTES"
+    )
+    token_negative_cache_size: int = Field(
+        default=10000, ge=0, validation_alias="TOKEN_NEGATIVE_CACHE_SIZE"
+    )
+    token_negative_cache_ttl: int = Field(
+        default=60, ge=0, validation_alias="TOKEN_NEGATIVE_CACHE_TTL"
+    )  # seconds a rejected token is answered from the cache
+    log_level: str = Field(default="INFO", validation_alias="LOG_LEVEL")
+    log_sample_rate: float = Field(
+        default=1.0, ge=0.0, le=1.0, validation_alias="LOG_SAMPLE_RATE"
+    )  # share of successful requests logged
+    log_route_sample_rates: Dict[str, float] = Field(
+        default_factory=dict, validation_alias="LOG_ROUTE_SAMPLE_RATES"
+    )  # JSON object, e.g. {"/me": 0.01}; keys are route templates
     keycloak_admin_realm: str = Field(
         default="master", validation_alias="KEYCLOAK_ADMIN_REALM"
     )
@@ -34,6 +76,9 @@ class Settings(BaseSettings):
     keycloak_admin_password: SecretStr = Field(
         default="admin", validation_alias="KEYCLOAK_ADMIN_PASSWORD"
     )
+    keycloak_admin_concurrency: int = Field(
+        default=10, ge=1, validation_alias="KEYCLOAK_ADMIN_CONCURRENCY"
+    )  # max in-flight admin requests during bulk operations
     service_username: str = Field(
         default="service-user", validation_alias="SERVICE_USERNAME"
     )
@@ -55,6 +100,21 @@ class Settings(BaseSettings):
     def resolved_audience(self) -> str:
         return self.keycloak_audience or self.keycloak_client_id
 
+    @property
+    def trusted_issuers(self) -> List[TrustedIssuer]:
+        issuers = self.keycloak_trusted_issuers or [
+            TrustedIssuer(issuer=self.issuer, jwks_url=self.jwks_url)
+        ]
+        return [
+            issuer.model_copy(
+                update={
+                    "issuer": issuer.issuer.rstrip("/"),
+                    "audience": issuer.audience or self.resolved_audience,
+                }
+            )
+            for issuer in issuers
+        ]
+
 
 @lru_cache
 def get_settings() -> Settings:
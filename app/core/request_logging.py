@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from conf.logging_config import RequestLogSampler
+
+logger = logging.getLogger("app.request")
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+
+def _incoming_request_id(scope: Scope) -> Optional[str]:
+    for name, value in scope.get("headers", ()):
+        if name == REQUEST_ID_HEADER:
+            return value.decode("latin-1")[:128] or None
+    return None
+
+
+class RequestLoggingMiddleware:
+    """Pure ASGI middleware that tags requests with an id and logs them.
+
+    The id is taken from an incoming ``X-Request-ID`` header or generated,
+    and echoed on the response. Whether a finished request is logged is
+    decided by ``sampler``; the log call itself only enqueues the record
+    (see ``conf.logging_config.setup_logging``).
+    """
+
+    def __init__(self, app: ASGIApp, sampler: Optional[RequestLogSampler] = None) -> None:
+        self.app = app
+        self.sampler = sampler or RequestLogSampler()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = _incoming_request_id(scope) or os.urandom(16).hex()
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_request_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (REQUEST_ID_HEADER, request_id.encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        except Exception:
+            self._log(scope, request_id, 500, started, exc_info=True)
+            raise
+
+        # the router stores the matched route on the shared scope
+        route = getattr(scope.get("route"), "path", scope["path"])
+        if self.sampler.should_log(route, status_code):
+            self._log(scope, request_id, status_code, started, route=route)
+
+    def _log(
+        self,
+        scope: Scope,
+        request_id: str,
+        status_code: int,
+        started: float,
+        route: Optional[str] = None,
+        exc_info: bool = False,
+    ) -> None:
+        if status_code >= 500:
+            level = logging.ERROR
+        elif status_code >= 400:
+            level = logging.WARNING
+        else:
+            level = logging.INFO
+        if not logger.isEnabledFor(level):
+            return
+        fields: Dict[str, Any] = {
+            "request_id": request_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": route or getattr(scope.get("route"), "path", scope["path"]),
+            "status": status_code,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+        # makeRecord + handle skips Logger.findCaller's stack walk, the most
+        # expensive part of a plain logger.log() call.
+        logger.handle(
+            logger.makeRecord(
+                logger.name,
+                level,
+                __name__,
+                0,
+                "request",
+                (),
+                sys.exc_info() if exc_info else None,
+                extra={"fields": fields},
+            )
+        )
@@ -1,9 +1,16 @@
 from __future__ import annotations
 from jose import jwt, JWTError
 
-import json
+import asyncio
+import hashlib
+import multiprocessing
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from functools import lru_cache
-from typing import Any, Dict, Callable
+from typing import Any, Dict, Callable, List, Optional, Tuple
 
 import httpx
 from fastapi import Depends, HTTPException, status
@@ -14,54 +21,215 @@ from fastapi.security import (
     HTTPBasicCredentials,
 )
 
-from app.core.config import get_settings
+from app.core.config import TrustedIssuer, get_settings
 
 bearer_scheme = HTTPBearer(auto_error=False)
 basic_scheme = HTTPBasic(auto_error=False)
 
+JWKS_FETCH_TIMEOUT = 3.0  # seconds
+JWKS_REFRESH_BACKOFF = 30.0  # seconds between retries after a failed refresh
+
+
+class IssuerKeyStore:
+    """JWKS cache and validation policy for a single trusted issuer."""
+
+    def __init__(self, trusted: TrustedIssuer, cache_ttl: int) -> None:
+        self.issuer = trusted.issuer
+        self.audience = trusted.audience
+        self.algorithms = list(trusted.algorithms)
+        self.jwks_url = trusted.resolved_jwks_url
+        self._cache_ttl = cache_ttl
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._fetched_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    async def _refresh(self) -> None:
+        try:
+            async with httpx.AsyncClient(timeout=JWKS_FETCH_TIMEOUT) as client:
+                resp = await client.get(self.jwks_url)
+                resp.raise_for_status()
+                jwks = resp.json()
+            keys = {
+                key["kid"]: {
+                    "kty": key.get("kty"),
+                    "kid": key.get("kid"),
+                    "use": key.get("use"),
+                    "n": key.get("n"),
+                    "e": key.get("e"),
+                }
+                for key in jwks.get("keys", [])
+                if isinstance(key.get("kid"), str)
+            }
+        except (httpx.HTTPError, ValueError, AttributeError):
+            # Keep serving the last good keys and retry after a back-off
+            # instead of stalling every request on a dead Keycloak.
+            self._fetched_at = time.monotonic() - self._cache_ttl + JWKS_REFRESH_BACKOFF
+            return
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+
+    async def refresh_if_stale(self) -> None:
+        """Download JWKS once per TTL without blocking the event loop.
+
+        One request does the download; while it runs, others keep using the
+        current keys and only wait when there are none yet.
+        """
+        if time.monotonic() - self._fetched_at <= self._cache_ttl:
+            return
+        if self._lock.locked() and self._keys:
+            return
+        async with self._lock:
+            if time.monotonic() - self._fetched_at > self._cache_ttl:
+                await self._refresh()
+
+    def get_key(self, kid: str | None) -> Dict[str, Any] | None:
+        """Return the cached signing key for ``kid``; never does I/O."""
+        if not self._keys:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Signing keys unavailable.",
+            )
+        return self._keys.get(kid) if isinstance(kid, str) else None
+
 
 @lru_cache
-def _get_jwks() -> Dict[str, Any]:
-    """Download JWKS keys from Keycloak once and cache them."""
+def _get_key_stores() -> Dict[str, IssuerKeyStore]:
+    """Index of trusted issuer -> key store, built once from settings."""
     settings = get_settings()
-    with httpx.Client() as client:
-        resp = client.get(settings.jwks_url)
-        resp.raise_for_status()
-        return resp.json()
+    return {
+        trusted.issuer: IssuerKeyStore(trusted, settings.jwks_cache_ttl)
+        for trusted in settings.trusted_issuers
+    }
+
+
+class TokenRejections:
+    """Bounded negative cache of rejected tokens and rejection counters.
+
+    Tokens are remembered by a 128-bit BLAKE2b digest together with the
+    error they produced, so a replayed token is turned away with one hash
+    and one dict lookup. Counters are per worker process.
+    """
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[bytes, Tuple[float, str]]" = OrderedDict()
+        self._counts: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def lookup(self, digest: bytes) -> Optional[str]:
+        """Return the cached error detail for ``digest``, if still fresh."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[digest]
+                return None
+            self._counts["negative_cache"] += 1
+            return entry[1]
 
+    def reject(
+        self, reason: str, detail: str, digest: Optional[bytes] = None
+    ) -> HTTPException:
+        """Count a rejection, remember the token and build the 401."""
+        with self._lock:
+            self._counts[reason] += 1
+            if digest is not None and self.max_entries > 0:
+                self._entries[digest] = (time.monotonic() + self.ttl, detail)
+                self._entries.move_to_end(digest)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail)
 
-def _decode_access_token(token: str) -> Dict[str, Any]:
-    """Verify and decode JWT access token from Keycloak."""
+    def count(self, outcome: str) -> None:
+        with self._lock:
+            self._counts[outcome] += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+@lru_cache
+def get_token_rejections() -> TokenRejections:
     settings = get_settings()
-    jwks = _get_jwks()
+    return TokenRejections(
+        settings.token_negative_cache_size, settings.token_negative_cache_ttl
+    )
+
+
+async def _prefilter_token(token: str) -> Tuple[IssuerKeyStore, Dict[str, Any], bytes]:
+    """Reject tokens that cannot verify before doing any crypto work.
+
+    Checks, cheapest first: size cap, segment count, negative cache, then on
+    the unverified header and payload the issuer, ``alg`` allow-list and
+    ``exp``, and last the ``kid``, which may need a JWKS download. Returns
+    the key store, signing key and digest of a token that is worth verifying.
+    """
+    rejections = get_token_rejections()
+    if len(token) > get_settings().token_max_bytes:
+        # not cached: hashing oversized input is the work we want to avoid
+        raise rejections.reject("oversized", "Invalid token.")
+    if token.count(".") != 2:
+        raise rejections.reject("malformed", "Invalid token.")
+
+    digest = rejections.digest(token)
+    cached = rejections.lookup(digest)
+    if cached is not None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=cached)
 
-    unverified_header = jwt.get_unverified_header(token)
+    try:
+        unverified_header = jwt.get_unverified_header(token)
+        unverified_claims = jwt.get_unverified_claims(token)
+    except JWTError:
+        raise rejections.reject("malformed", "Invalid token.", digest)
+
+    issuer = unverified_claims.get("iss")
+    alg = unverified_header.get("alg")
     kid = unverified_header.get("kid")
+    # lists/objects here would blow up the dict lookups below with a TypeError
+    if not all(isinstance(value, str) for value in (issuer, alg, kid)):
+        raise rejections.reject("malformed", "Invalid token.", digest)
+
+    store = _get_key_stores().get(issuer)
+    if store is None:
+        raise rejections.reject("untrusted_issuer", "Untrusted token issuer.", digest)
 
-    key = next((k for k in jwks["keys"] if k.get("kid") == kid), None)
+    if alg not in store.algorithms:
+        raise rejections.reject("alg_not_allowed", "Invalid token.", digest)
+
+    exp = unverified_claims.get("exp")
+    if not isinstance(exp, (int, float)) or isinstance(exp, bool):
+        raise rejections.reject("malformed", "Invalid token.", digest)
+    if exp <= time.time():
+        raise rejections.reject("expired", "Token expired.", digest)
+
+    await store.refresh_if_stale()
+    key = store.get_key(kid)
     if not key:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Signing key not found.",
-        )
+        # not cached: the kid may be a freshly rotated key the next JWKS
+        # refresh picks up
+        raise rejections.reject("unknown_kid", "Signing key not found.")
 
-    rsa_key = {
-        "kty": key.get("kty"),
-        "kid": key.get("kid"),
-        "use": key.get("use"),
-        "n": key.get("n"),
-        "e": key.get("e"),
-    }
+    return store, key, digest
 
+
+def _verify_signature(
+    token: str, key: Dict[str, Any], algorithms: List[str], audience: str, issuer: str
+) -> Dict[str, Any]:
     try:
-        claims = jwt.decode(
+        return jwt.decode(
             token,
-            rsa_key,
-            algorithms=["RS256"],
-            options={"verify_aud": False},  # issuer رو هم چون ندادیم، چک نمی‌کنه
+            key,
+            algorithms=algorithms,
+            audience=audience,
+            issuer=issuer,
         )
-        return claims
-
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -69,6 +237,107 @@ def _decode_access_token(token: str) -> Dict[str, Any]:
         )
 
 
+async def _decode_access_token(token: str) -> Dict[str, Any]:
+    """Verify and decode JWT access token from any trusted Keycloak realm."""
+    store, key, digest = await _prefilter_token(token)
+    rejections = get_token_rejections()
+    try:
+        claims = _verify_signature(
+            token, key, store.algorithms, store.audience, store.issuer
+        )
+    except HTTPException as exc:
+        raise rejections.reject("invalid", exc.detail, digest)
+    rejections.count("verified")
+    return claims
+
+
+@lru_cache
+def _get_verify_executor() -> Optional[Executor]:
+    """Pool used for token verification, or ``None`` to verify inline."""
+    settings = get_settings()
+    if settings.token_verify_executor == "thread":
+        return ThreadPoolExecutor(
+            max_workers=settings.token_verify_workers,
+            thread_name_prefix="token-verify",
+        )
+    if settings.token_verify_executor == "process":
+        # spawn: forking a worker that already runs an event loop is unsafe
+        return ProcessPoolExecutor(
+            max_workers=settings.token_verify_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return None
+
+
+def _warm_worker() -> None:
+    """No-op task; running it makes a spawned worker import this module."""
+
+
+async def start_verify_executor() -> None:
+    """Create the verification pool and start all of its workers.
+
+    Spawned process workers import FastAPI and jose on start-up; doing that
+    here keeps it off the first pooled requests.
+    """
+    executor = _get_verify_executor()
+    if executor is None:
+        return
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(
+        *(
+            loop.run_in_executor(executor, _warm_worker)
+            for _ in range(get_settings().token_verify_workers)
+        )
+    )
+
+
+def shutdown_verify_executor() -> None:
+    """Stop the verification pool, if one was started."""
+    if _get_verify_executor.cache_info().currsize:
+        executor = _get_verify_executor()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    _get_verify_executor.cache_clear()
+
+
+def _verify_in_worker(
+    token: str, key: Dict[str, Any], algorithms: List[str], audience: str, issuer: str
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Pool entry point; returns the error instead of raising it because
+    HTTPException does not survive pickling across processes."""
+    try:
+        return _verify_signature(token, key, algorithms, audience, issuer), None
+    except HTTPException as exc:
+        return None, exc.detail
+
+
+async def _verify_token(token: str) -> Dict[str, Any]:
+    settings = get_settings()
+    executor = _get_verify_executor()
+    if executor is None or len(token) <= settings.token_verify_inline_max_bytes:
+        return await _decode_access_token(token)
+
+    # the pre-verification stage and negative cache stay on this process so
+    # garbage never reaches the pool and rejections are counted in one place
+    store, key, digest = await _prefilter_token(token)
+    rejections = get_token_rejections()
+    args = (token, key, store.algorithms, store.audience, store.issuer)
+    loop = asyncio.get_running_loop()
+    try:
+        claims, error = await loop.run_in_executor(executor, _verify_in_worker, *args)
+    except BrokenProcessPool:
+        # A pool child died (e.g. OOM-killed), which breaks the whole pool.
+        # Replace it for later requests and verify this token here.
+        if _get_verify_executor() is executor:
+            _get_verify_executor.cache_clear()
+        executor.shutdown(wait=False, cancel_futures=True)
+        claims, error = _verify_in_worker(*args)
+    if error is not None:
+        raise rejections.reject("invalid", error, digest)
+    rejections.count("verified")
+    return claims
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
 ) -> Dict[str, Any]:
@@ -88,7 +357,7 @@ async def get_current_user(
         )
 
     token = credentials.credentials
-    return _decode_access_token(token)
+    return await _verify_token(token)
 
 
 def require_role(role: str) -> Callable:
@@ -1,12 +1,19 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+import asyncio
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set
+from urllib.parse import quote
 
 import httpx
 from fastapi import HTTPException, status
 
 from app.core.config import Settings, get_settings
 
+USER_ID_PATTERN = re.compile(
+    r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.IGNORECASE
+)
+
 
 class KeycloakAdminClient:
     """Thin async wrapper around the Keycloak Admin REST API."""
@@ -14,17 +21,26 @@ class KeycloakAdminClient:
     def __init__(self, settings: Optional[Settings] = None) -> None:
         self.settings = settings or get_settings()
 
+    @property
+    def _base_url(self) -> str:
+        # str(AnyHttpUrl) keeps a trailing slash, which would give "//admin/..."
+        return str(self.settings.keycloak_server_url).rstrip("/")
+
     @property
     def _token_url(self) -> str:
-        return f"{self.settings.keycloak_server_url}/realms/{self.settings.keycloak_admin_realm}/protocol/openid-connect/token"
+        return f"{self._base_url}/realms/{self.settings.keycloak_admin_realm}/protocol/openid-connect/token"
 
     @property
     def _users_url(self) -> str:
-        return f"{self.settings.keycloak_server_url}/admin/realms/{self.settings.keycloak_realm}/users"
+        return f"{self._base_url}/admin/realms/{self.settings.keycloak_realm}/users"
 
     @property
     def _roles_url(self) -> str:
-        return f"{self.settings.keycloak_server_url}/admin/realms/{self.settings.keycloak_realm}/roles"
+        return f"{self._base_url}/admin/realms/{self.settings.keycloak_realm}/roles"
+
+    def _user_url(self, user_id: str) -> str:
+        # httpx resolves dot segments, so an unescaped id could walk out of /users
+        return f"{self._users_url}/{quote(user_id, safe='')}"
 
     async def _admin_token(self) -> str:
         data = {
@@ -69,7 +85,7 @@ class KeycloakAdminClient:
         token = token or await self._admin_token()
         async with httpx.AsyncClient(timeout=10) as client:
             response = await client.get(
-                f"{self._users_url}/{user_id}", headers=self._auth_header(token)
+                self._user_url(user_id), headers=self._auth_header(token)
             )
             if response.status_code == status.HTTP_404_NOT_FOUND:
                 raise HTTPException(status_code=404, detail="Keycloak user not found.")
@@ -103,7 +119,7 @@ class KeycloakAdminClient:
         role = await self._get_realm_role(role_name, token)
         async with httpx.AsyncClient(timeout=10) as client:
             response = await client.post(
-                f"{self._users_url}/{user_id}/role-mappings/realm",
+                f"{self._user_url(user_id)}/role-mappings/realm",
                 json=[role],
                 headers=self._auth_header(token),
             )
@@ -128,5 +144,151 @@ class KeycloakAdminClient:
                 )
             return response.json()
 
+    async def reconcile_realm_roles(
+        self,
+        desired: Dict[str, Iterable[str]],
+        managed_roles: Optional[Iterable[str]] = None,
+        dry_run: bool = False,
+        token: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Bring the realm role mappings of many users to the desired sets.
+
+        Only roles in ``managed_roles`` (by default every role named in
+        ``desired``) are added or removed, so default realm roles are left
+        alone. Realm roles are resolved with a single list call, current
+        mappings are read with at most ``keycloak_admin_concurrency`` requests
+        in flight, and each user gets at most one add and one remove request.
+        Keys of ``desired`` must be Keycloak user UUIDs; anything else is
+        reported as a per-user error without calling Keycloak.
+
+        ``added``/``removed`` in each result hold the planned changes for a
+        dry run and otherwise only the changes Keycloak confirmed. A user whose
+        add went through but whose removal failed is reported as ``partial``.
+        """
+        token = token or await self._admin_token()
+        wanted = {user_id: set(roles) for user_id, roles in desired.items()}
+        managed = (
+            set(managed_roles)
+            if managed_roles is not None
+            else set().union(*wanted.values())
+        )
+        semaphore = asyncio.Semaphore(self.settings.keycloak_admin_concurrency)
+
+        async with httpx.AsyncClient(timeout=10) as client:
+            realm_roles = await self._list_realm_roles(client, token)
 
+            async def reconcile_user(user_id: str, roles: Set[str]) -> Dict[str, Any]:
+                result: Dict[str, Any] = {
+                    "user_id": user_id,
+                    "added": [],
+                    "removed": [],
+                    "status": "unchanged",
+                    "error": None,
+                }
+                if not USER_ID_PATTERN.match(user_id):
+                    result["status"] = "error"
+                    result["error"] = "Invalid Keycloak user ID."
+                    return result
+                unknown = sorted(roles - realm_roles.keys())
+                if unknown:
+                    result["status"] = "error"
+                    result["error"] = f"Unknown realm roles: {', '.join(unknown)}."
+                    return result
+                unmanaged = sorted(roles - managed)
+                if unmanaged:
+                    result["status"] = "error"
+                    result["error"] = f"Roles outside managed_roles: {', '.join(unmanaged)}."
+                    return result
+                async with semaphore:
+                    try:
+                        current = await self._get_user_realm_roles(client, token, user_id)
+                        to_add = sorted(roles - current)
+                        to_remove = sorted((current & managed) - roles)
+                        if not (to_add or to_remove):
+                            return result
+                        if dry_run:
+                            result.update(added=to_add, removed=to_remove, status="planned")
+                            return result
+                        for field, method, names in (
+                            ("added", "POST", to_add),
+                            ("removed", "DELETE", to_remove),
+                        ):
+                            if names:
+                                await self._change_user_realm_roles(
+                                    client,
+                                    token,
+                                    user_id,
+                                    [realm_roles[name] for name in names],
+                                    method,
+                                )
+                                result[field] = names
+                        result["status"] = "applied"
+                    except (HTTPException, httpx.HTTPError) as exc:
+                        # one unreachable call must not sink the other users
+                        result["error"] = (
+                            exc.detail
+                            if isinstance(exc, HTTPException)
+                            else f"Keycloak request failed: {type(exc).__name__}."
+                        )
+                        applied_any = result["added"] or result["removed"]
+                        result["status"] = "partial" if applied_any else "error"
+                return result
 
+            return list(
+                await asyncio.gather(
+                    *(reconcile_user(user_id, roles) for user_id, roles in wanted.items())
+                )
+            )
+
+    async def _list_realm_roles(
+        self, client: httpx.AsyncClient, token: str
+    ) -> Dict[str, Dict[str, Any]]:
+        response = await client.get(
+            self._roles_url, params={"max": -1}, headers=self._auth_header(token)
+        )
+        if response.status_code != status.HTTP_200_OK:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Failed to list realm roles from Keycloak.",
+            )
+        return {role["name"]: role for role in response.json()}
+
+    async def _get_user_realm_roles(
+        self, client: httpx.AsyncClient, token: str, user_id: str
+    ) -> Set[str]:
+        response = await client.get(
+            f"{self._user_url(user_id)}/role-mappings/realm",
+            headers=self._auth_header(token),
+        )
+        if response.status_code == status.HTTP_404_NOT_FOUND:
+            raise HTTPException(status_code=404, detail="Keycloak user not found.")
+        if response.status_code != status.HTTP_200_OK:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Failed to read role mappings from Keycloak.",
+            )
+        return {role["name"] for role in response.json()}
+
+    async def _change_user_realm_roles(
+        self,
+        client: httpx.AsyncClient,
+        token: str,
+        user_id: str,
+        roles: List[Dict[str, Any]],
+        method: str,
+    ) -> None:
+        response = await client.request(
+            method,
+            f"{self._user_url(user_id)}/role-mappings/realm",
+            json=roles,
+            headers=self._auth_header(token),
+        )
+        if response.status_code not in (
+            status.HTTP_204_NO_CONTENT,
+            status.HTTP_201_CREATED,
+        ):
+            action = "assign" if method == "POST" else "remove"
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Failed to {action} realm roles.",
+            )
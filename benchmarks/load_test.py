@@ -0,0 +1,289 @@
+"""Drive the service at a target request rate against a fake Keycloak.
+
+Starts ``tests.fake_keycloak`` and ``uvicorn main:app --workers N`` as child
+processes, then fires an open-loop request stream at ``/me``, ``/admin``,
+``/service-data`` and ``/api/v1/users`` and reports throughput, latency
+percentiles and error rates per endpoint.
+
+    python -m benchmarks.load_test --rps 500 --duration 30 --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import uvicorn
+
+from tests.fake_keycloak import FakeKeycloak, free_port
+
+REALM = "master"
+SERVICE_USERNAME = "service-user"
+SERVICE_PASSWORD = "service-pass"
+ENDPOINTS = ("me", "admin", "service-data", "users")
+
+
+def _run_fake_keycloak(port: int, latency: float, token_lifetime: int) -> None:
+    fake = FakeKeycloak.with_defaults(
+        realm=REALM, latency=latency, token_lifetime=token_lifetime
+    )
+    uvicorn.run(fake.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _wait_until_up(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s.")
+
+
+def _password_token(keycloak_url: str, username: str, password: str) -> str:
+    response = httpx.post(
+        f"{keycloak_url}/realms/{REALM}/protocol/openid-connect/token",
+        data={
+            "grant_type": "password",
+            "client_id": "backend-service",
+            "username": username,
+            "password": password,
+        },
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def parse_mix(value: str) -> List[Tuple[str, int]]:
+    mix = []
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint '{name}'")
+        mix.append((name, int(weight or 1)))
+    return mix
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def _drive(
+    base_url: str,
+    requests: Dict[str, Dict[str, object]],
+    mix: List[Tuple[str, int]],
+    rps: float,
+    duration: float,
+) -> Tuple[Dict[str, List[float]], Dict[str, Dict[str, int]], float]:
+    schedule = [name for name, weight in mix for _ in range(weight)]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    outcomes: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    limits = httpx.Limits(max_connections=1000, max_keepalive_connections=1000)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+
+        async def fire(name: str) -> None:
+            started = time.perf_counter()
+            try:
+                response = await client.get(**requests[name])
+                outcome = str(response.status_code)
+            except httpx.HTTPError as exc:
+                outcome = type(exc).__name__
+            latencies[name].append(time.perf_counter() - started)
+            outcomes[name][outcome] += 1
+
+        tasks = []
+        interval = 1.0 / rps
+        total = int(rps * duration)
+        start = time.perf_counter()
+        # Open loop: requests are sent on schedule regardless of how long earlier
+        # ones take, so server-side queueing shows up as latency.
+        for i in range(total):
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(schedule[i % len(schedule)])))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    return latencies, outcomes, elapsed
+
+
+def report(
+    latencies: Dict[str, List[float]],
+    outcomes: Dict[str, Dict[str, int]],
+    elapsed: float,
+    token_outcomes: Optional[Dict[str, int]] = None,
+) -> None:
+    header = f"{'endpoint':<14}{'count':>8}{'rps':>9}{'err%':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}  statuses"
+    print(header)
+    print("-" * len(header))
+    all_latencies: List[float] = []
+    all_errors = 0
+    for name in ENDPOINTS:
+        values = sorted(latencies.get(name, []))
+        if not values:
+            continue
+        all_latencies.extend(values)
+        errors = sum(n for code, n in outcomes[name].items() if not code.startswith("2"))
+        all_errors += errors
+        statuses = " ".join(f"{code}={n}" for code, n in sorted(outcomes[name].items()))
+        print(
+            f"{name:<14}{len(values):>8}{len(values) / elapsed:>9.1f}"
+            f"{100 * errors / len(values):>8.2f}"
+            f"{_percentile(values, 50) * 1000:>9.2f}{_percentile(values, 90) * 1000:>9.2f}"
+            f"{_percentile(values, 99) * 1000:>9.2f}{values[-1] * 1000:>9.2f}  {statuses}"
+        )
+    all_latencies.sort()
+    if all_latencies:
+        print("-" * len(header))
+        print(
+            f"{'total':<14}{len(all_latencies):>8}{len(all_latencies) / elapsed:>9.1f}"
+            f"{100 * all_errors / len(all_latencies):>8.2f}"
+            f"{_percentile(all_latencies, 50) * 1000:>9.2f}"
+            f"{_percentile(all_latencies, 90) * 1000:>9.2f}"
+            f"{_percentile(all_latencies, 99) * 1000:>9.2f}"
+            f"{all_latencies[-1] * 1000:>9.2f}"
+        )
+    if token_outcomes:
+        print("bearer tokens: " + " ".join(f"{k}={v}" for k, v in sorted(token_outcomes.items())))
+
+
+def collect_token_outcomes(
+    app_url: str, headers: Dict[str, str], workers: int
+) -> Dict[str, int]:
+    """Sum ``/admin/token-rejections`` over all uvicorn workers.
+
+    Counters live in each worker process and a call is answered by whichever
+    worker accepts the connection, so poll on fresh connections until every
+    ``pid`` has reported (or give up after a bounded number of tries).
+    """
+    readings: Dict[int, Dict[str, int]] = {}
+    for _ in range(workers * 25):
+        body = httpx.get(f"{app_url}/admin/token-rejections", headers=headers).json()
+        readings[body["pid"]] = body["counts"]
+        if len(readings) == workers:
+            break
+    total: Counter[str] = Counter()
+    for counts in readings.values():
+        total.update(counts)
+    total["workers_reporting"] = len(readings)
+    return dict(total)
+
+
+def run_load(
+    rps: float,
+    duration: float,
+    workers: int,
+    keycloak_latency: float,
+    mix: List[Tuple[str, int]],
+    extra_env: Optional[Dict[str, str]] = None,
+) -> Tuple[Dict[str, List[float]], Dict[str, Dict[str, int]], float, Dict[str, int]]:
+    """Start fake Keycloak + service, run one load pass and tear both down.
+
+    Returns the inputs of ``report``, including bearer token outcomes summed
+    over the workers.
+    """
+    kc_port, app_port = free_port(), free_port()
+    keycloak_url = f"http://127.0.0.1:{kc_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+    token_lifetime = int(duration) + 600
+
+    fake = multiprocessing.Process(
+        target=_run_fake_keycloak,
+        args=(kc_port, keycloak_latency, token_lifetime),
+        daemon=True,
+    )
+    fake.start()
+    env = {
+        **os.environ,
+        "KEYCLOAK_SERVER_URL": keycloak_url,
+        "KEYCLOAK_REALM": REALM,
+        "KEYCLOAK_ADMIN_REALM": REALM,
+        "KEYCLOAK_ADMIN_USERNAME": "admin",
+        "KEYCLOAK_ADMIN_PASSWORD": "admin",
+        "SERVICE_USERNAME": SERVICE_USERNAME,
+        "SERVICE_PASSWORD": SERVICE_PASSWORD,
+        **(extra_env or {}),
+    }
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(app_port),
+            "--workers", str(workers), "--log-level", "warning",
+            "--no-access-log",
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,  # JSON request logs would drown the report
+    )
+    try:
+        _wait_until_up(f"{keycloak_url}/realms/{REALM}/protocol/openid-connect/certs")
+        _wait_until_up(f"{app_url}/")
+        admin = {"Authorization": f"Bearer {_password_token(keycloak_url, 'admin', 'admin')}"}
+        user = {"Authorization": f"Bearer {_password_token(keycloak_url, 'alice', 'alice-pass')}"}
+        requests: Dict[str, Dict[str, object]] = {
+            "me": {"url": "/me", "headers": user},
+            "admin": {"url": "/admin", "headers": admin},
+            "service-data": {
+                "url": "/service-data",
+                "auth": (SERVICE_USERNAME, SERVICE_PASSWORD),
+            },
+            "users": {"url": "/api/v1/users", "headers": admin},
+        }
+        latencies, outcomes, elapsed = asyncio.run(
+            _drive(app_url, requests, mix, rps, duration)
+        )
+        return latencies, outcomes, elapsed, collect_token_outcomes(app_url, admin, workers)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        fake.terminate()
+        fake.join(timeout=10)
+
+
+def add_common_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--rps", type=float, default=200.0, help="target requests per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--workers", type=int, default=4, help="uvicorn worker processes")
+    parser.add_argument(
+        "--keycloak-latency",
+        type=float,
+        default=0.005,
+        help="seconds the fake Keycloak sleeps before every response",
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    add_common_arguments(parser)
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=parse_mix("me=4,admin=2,service-data=2,users=1"),
+        help="comma separated endpoint=weight pairs",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"target {args.rps:.0f} rps for {args.duration:.0f}s, {args.workers} workers, "
+        f"keycloak latency {args.keycloak_latency * 1000:.1f} ms"
+    )
+    report(
+        *run_load(args.rps, args.duration, args.workers, args.keycloak_latency, args.mix)
+    )
+
+
+if __name__ == "__main__":
+    main()
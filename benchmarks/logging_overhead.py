@@ -0,0 +1,105 @@
+"""Measure the per-request cost of ``RequestLoggingMiddleware``.
+
+Calls a trivial ASGI app directly, without a server, bare and wrapped in the
+middleware with sampling off (rate 0) and on (rate 1, every request is
+enqueued), and prints the mean time per request on the calling thread. The
+listener is paused while timing and the queue is drained afterwards, so the
+JSON encoding and write cost of the background thread is reported apart.
+
+    python -m benchmarks.logging_overhead --requests 200000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+from logging.handlers import QueueListener
+from typing import Any, Dict, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.request_logging import RequestLoggingMiddleware
+from conf.logging_config import RequestLogSampler, setup_logging
+
+BATCH = 1000
+
+
+async def _endpoint(scope: Scope, receive: Receive, send: Send) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _receive() -> Dict[str, Any]:
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message: Dict[str, Any]) -> None:
+    return None
+
+
+async def _time_per_request(
+    app: ASGIApp, requests: int, listener: QueueListener
+) -> Tuple[float, float]:
+    """Mean seconds per request on the caller and per record in the listener.
+
+    Requests run in batches with the listener paused; the queue is drained
+    between batches so records do not pile up and skew the timing with GC.
+    """
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/me",
+        "headers": [(b"authorization", b"Bearer x")],
+    }
+    calling = draining = 0.0
+    for _ in range(0, requests, BATCH):
+        started = time.perf_counter()
+        for _ in range(BATCH):
+            await app(dict(scope), _receive, _send)
+        calling += time.perf_counter() - started
+        started = time.perf_counter()
+        listener.start()
+        listener.stop()
+        draining += time.perf_counter() - started
+    total = requests // BATCH * BATCH
+    return calling / total, draining / total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--requests", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with open(os.devnull, "w") as devnull:
+        pipeline = setup_logging("INFO", stream=devnull)
+        listener = pipeline.listener
+        variants = {
+            "bare": _endpoint,
+            "middleware, sampled out": RequestLoggingMiddleware(
+                _endpoint, RequestLogSampler(default_rate=0.0)
+            ),
+            "middleware, logged": RequestLoggingMiddleware(
+                _endpoint, RequestLogSampler(default_rate=1.0)
+            ),
+        }
+        listener.stop()
+        results = {
+            name: asyncio.run(_time_per_request(app, args.requests, listener))
+            for name, app in variants.items()
+        }
+        listener.start()
+        pipeline.shutdown()
+
+    baseline = results["bare"][0]
+    for name, (per_request, per_record) in results.items():
+        print(
+            f"{name:<26}{per_request * 1e6:>8.2f} us/request"
+            f"{(per_request - baseline) * 1e6:>+10.2f} us overhead"
+            f"{per_record * 1e6:>10.2f} us in listener thread"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Compare tail latency of the token verification executor modes.
+
+Runs the same mixed workload (RSA-verified ``/me`` and ``/admin`` next to
+cheap ``/service-data``) once per ``TOKEN_VERIFY_EXECUTOR`` mode and prints
+per-endpoint percentiles for each, so the effect of moving verification off
+the event loop on the cheap requests is visible.
+
+    python -m benchmarks.verify_executor --rps 400 --duration 20 --workers 2
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from benchmarks.load_test import add_common_arguments, parse_mix, report, run_load
+
+MODES = ("inline", "thread", "process")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    add_common_arguments(parser)
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=parse_mix("me=3,admin=1,service-data=4"),
+        help="comma separated endpoint=weight pairs",
+    )
+    parser.add_argument(
+        "--pool-size", type=int, default=4, help="TOKEN_VERIFY_WORKERS for pooled modes"
+    )
+    parser.add_argument(
+        "--inline-max-bytes",
+        type=int,
+        default=0,
+        help="TOKEN_VERIFY_INLINE_MAX_BYTES for pooled modes",
+    )
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        print(
+            f"\n== {mode}: {args.rps:.0f} rps for {args.duration:.0f}s, "
+            f"{args.workers} workers, pool size {args.pool_size}"
+        )
+        report(
+            *run_load(
+                args.rps,
+                args.duration,
+                args.workers,
+                args.keycloak_latency,
+                args.mix,
+                extra_env={
+                    "TOKEN_VERIFY_EXECUTOR": mode,
+                    "TOKEN_VERIFY_WORKERS": str(args.pool_size),
+                    "TOKEN_VERIFY_INLINE_MAX_BYTES": str(args.inline_max_bytes),
+                },
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import IO, Any, Dict, Mapping, Optional
+
+NOISY_LOGGERS = ("httpx", "httpcore")
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a record as one JSON object per line.
+
+    Structured fields are passed as ``extra={"fields": {...}}`` and merged
+    into the top level of the object.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            payload.update(fields)
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class _FastQueueHandler(QueueHandler):
+    """QueueHandler that defers all formatting to the listener thread.
+
+    The stock ``prepare`` copies the record and renders the message and
+    traceback on the calling thread, which is only needed when records cross
+    a process boundary. The listener lives in the same process, so the record
+    is queued untouched.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class RequestLogSampler:
+    """Decides whether a finished request is logged.
+
+    Successful responses are kept with probability ``route_rates[route]``
+    (falling back to ``default_rate``); anything with status >= 400,
+    including every 401/403 decision, is always logged.
+    """
+
+    def __init__(
+        self, default_rate: float = 1.0, route_rates: Optional[Mapping[str, float]] = None
+    ) -> None:
+        self.default_rate = default_rate
+        self.route_rates = dict(route_rates or {})
+        self._random = random.random
+
+    def should_log(self, route: str, status_code: int) -> bool:
+        if status_code >= 400:
+            return True
+        rate = self.route_rates.get(route, self.default_rate)
+        return rate >= 1.0 or (rate > 0.0 and self._random() < rate)
+
+
+class LoggingPipeline:
+    """Queue handler on the root logger and the listener thread draining it."""
+
+    def __init__(self, handler: QueueHandler, listener: QueueListener) -> None:
+        self.handler = handler
+        self.listener = listener
+
+    def shutdown(self) -> None:
+        """Detach the handler, then flush and stop the listener.
+
+        Detaching first keeps later records from piling up in a queue that
+        nothing drains any more.
+        """
+        logging.getLogger().removeHandler(self.handler)
+        self.listener.stop()
+
+
+def setup_logging(level: str = "INFO", stream: Optional[IO[str]] = None) -> LoggingPipeline:
+    """Route the root logger through a queue drained by a background thread.
+
+    Callers on the event loop only pay for a ``SimpleQueue.put``; JSON
+    encoding and the stream write happen on the listener thread. The listener
+    is already started; call ``shutdown()`` on the result to flush and detach.
+    """
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, QueueHandler):
+            root.removeHandler(handler)
+    queue_handler = _FastQueueHandler(log_queue)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+    # httpx logs every outbound call at INFO, which would bypass sampling
+    for name in NOISY_LOGGERS:
+        logging.getLogger(name).setLevel(max(logging.WARNING, root.level))
+
+    listener = QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    return LoggingPipeline(queue_handler, listener)
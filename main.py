@@ -1,4 +1,6 @@
-from typing import Any, Dict
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
 
 from fastapi import Depends, FastAPI
 from fastapi.openapi.docs import get_swagger_ui_html
@@ -6,7 +8,26 @@ from fastapi.responses import JSONResponse
 
 from api.v1.routers import router as api_router
 from app.core.config import get_settings
-from app.core.security import get_current_user, get_service_user, require_role
+from app.core.request_logging import RequestLoggingMiddleware
+from app.core.security import (
+    get_current_user,
+    get_service_user,
+    get_token_rejections,
+    require_role,
+    shutdown_verify_executor,
+    start_verify_executor,
+)
+from conf.logging_config import RequestLogSampler, setup_logging
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    logging_pipeline = setup_logging(get_settings().log_level)
+    await start_verify_executor()
+    yield
+    shutdown_verify_executor()
+    logging_pipeline.shutdown()
+
 
 app = FastAPI(
     title="FastAPI + Keycloak",
@@ -14,6 +35,14 @@ app = FastAPI(
     docs_url=None,
     redoc_url=None,
     openapi_url=None,
+    lifespan=lifespan,
+)
+app.add_middleware(
+    RequestLoggingMiddleware,
+    sampler=RequestLogSampler(
+        default_rate=get_settings().log_sample_rate,
+        route_rates=get_settings().log_route_sample_rates,
+    ),
 )
 app.include_router(api_router)
 
@@ -43,6 +72,16 @@ async def admin_portal(_: Dict[str, Any] = Depends(require_role("admin"))) -> Di
     return {"message": "You have admin access from Keycloak!"}
 
 
+@app.get("/admin/token-rejections")
+async def token_rejections(_: Dict[str, Any] = Depends(require_role("admin"))) -> Dict[str, Any]:
+    """Bearer token outcomes by reason for the worker process that answers.
+
+    Counters are per process; under ``--workers N`` sum the readings of
+    every distinct ``pid``.
+    """
+    return {"pid": os.getpid(), "counts": get_token_rejections().snapshot()}
+
+
 @app.get("/service-data")
 async def service_data(service: Dict[str, Any] = Depends(get_service_user)) -> Dict[str, Any]:
     return {
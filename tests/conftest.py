@@ -0,0 +1,83 @@
+from typing import Iterator
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import get_settings
+from app.core.security import (
+    _get_key_stores,
+    get_token_rejections,
+    shutdown_verify_executor,
+)
+from tests.fake_keycloak import FakeKeycloak, serve_in_thread
+
+REALM = "master"
+
+
+@pytest.fixture(scope="session")
+def fake_keycloak() -> FakeKeycloak:
+    return FakeKeycloak.with_defaults(realm=REALM)
+
+
+@pytest.fixture(scope="session")
+def keycloak_url(fake_keycloak: FakeKeycloak) -> Iterator[str]:
+    with serve_in_thread(fake_keycloak.app) as url:
+        yield url
+
+
+@pytest.fixture
+def settings_env(keycloak_url: str, monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    """Point the service at the fake Keycloak and reset cached settings/keys."""
+    env = {
+        "KEYCLOAK_SERVER_URL": keycloak_url,
+        "KEYCLOAK_REALM": REALM,
+        "KEYCLOAK_ADMIN_REALM": REALM,
+        "KEYCLOAK_ADMIN_USERNAME": "admin",
+        "KEYCLOAK_ADMIN_PASSWORD": "admin",
+        "SERVICE_USERNAME": "service-user",
+        "SERVICE_PASSWORD": "service-pass",
+    }
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    get_settings.cache_clear()
+    _get_key_stores.cache_clear()
+    get_token_rejections.cache_clear()
+    shutdown_verify_executor()
+    yield
+    get_settings.cache_clear()
+    _get_key_stores.cache_clear()
+    get_token_rejections.cache_clear()
+    shutdown_verify_executor()
+
+
+@pytest.fixture
+def client(settings_env: None) -> Iterator[TestClient]:
+    from main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _password_token(keycloak_url: str, username: str, password: str) -> str:
+    response = httpx.post(
+        f"{keycloak_url}/realms/{REALM}/protocol/openid-connect/token",
+        data={
+            "grant_type": "password",
+            "client_id": "backend-service",
+            "username": username,
+            "password": password,
+        },
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+@pytest.fixture
+def admin_token(keycloak_url: str) -> str:
+    return _password_token(keycloak_url, "admin", "admin")
+
+
+@pytest.fixture
+def user_token(keycloak_url: str) -> str:
+    return _password_token(keycloak_url, "alice", "alice-pass")
@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import parse_qs
+
+import uvicorn
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import Body, FastAPI, HTTPException, Request, Response, status
+from jose import jwt
+
+
+def _b64url_uint(value: int) -> str:
+    raw = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+class FakeKeycloak:
+    """In-memory stand-in for the Keycloak endpoints this service talks to.
+
+    Covers the OIDC token and certs endpoints used by ``app.core.security``
+    and the users / roles / role-mappings admin endpoints used by
+    ``KeycloakAdminClient``. Every request is delayed by ``latency`` seconds
+    to mimic a remote Keycloak.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        token_lifetime: int = 300,
+        client_id: str = "backend-service",
+    ) -> None:
+        self.latency = latency
+        self.token_lifetime = token_lifetime
+        self.client_id = client_id
+        self.kid = uuid.uuid4().hex
+        self._private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.private_key_pem = self._private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        ).decode("ascii")
+        # realm -> {user_id: user representation}
+        self.users: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # realm -> {user_id: password}
+        self.passwords: Dict[str, Dict[str, str]] = {}
+        # realm -> {role name: role representation}
+        self.roles: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # realm -> {user_id: [role names]}
+        self.role_mappings: Dict[str, Dict[str, List[str]]] = {}
+        self.app = self._build_app()
+
+    # ------------------------------------------------------------------
+    # Seeding helpers
+    # ------------------------------------------------------------------
+    @classmethod
+    def with_defaults(cls, realm: str = "master", **kwargs: Any) -> "FakeKeycloak":
+        """Realm with ``admin``/``client`` roles, an admin and a plain user."""
+        fake = cls(**kwargs)
+        fake.add_role(realm, "client")
+        fake.add_user(realm, "admin", "admin", roles=["admin"], email="admin@example.com")
+        fake.add_user(realm, "alice", "alice-pass", roles=["client"], email="alice@example.com")
+        return fake
+
+    def add_role(self, realm: str, name: str) -> Dict[str, Any]:
+        roles = self.roles.setdefault(realm, {})
+        if name not in roles:
+            roles[name] = {
+                "id": str(uuid.uuid4()),
+                "name": name,
+                "composite": False,
+                "clientRole": False,
+                "containerId": realm,
+            }
+        return roles[name]
+
+    def add_user(
+        self,
+        realm: str,
+        username: str,
+        password: str,
+        roles: Optional[List[str]] = None,
+        email: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        user_id = str(uuid.uuid4())
+        user = {
+            "id": user_id,
+            "username": username,
+            "email": email,
+            "firstName": None,
+            "lastName": None,
+            "enabled": True,
+            "emailVerified": bool(email),
+            "createdTimestamp": int(time.time() * 1000),
+        }
+        self.users.setdefault(realm, {})[user_id] = user
+        self.passwords.setdefault(realm, {})[user_id] = password
+        self.role_mappings.setdefault(realm, {})[user_id] = []
+        for role in roles or []:
+            self.add_role(realm, role)
+            self.role_mappings[realm][user_id].append(role)
+        return user
+
+    def find_user(self, realm: str, username: str) -> Optional[Dict[str, Any]]:
+        for user in self.users.get(realm, {}).values():
+            if user["username"] == username:
+                return user
+        return None
+
+    @property
+    def jwks(self) -> Dict[str, Any]:
+        numbers = self._private_key.public_key().public_numbers()
+        return {
+            "keys": [
+                {
+                    "kid": self.kid,
+                    "kty": "RSA",
+                    "alg": "RS256",
+                    "use": "sig",
+                    "n": _b64url_uint(numbers.n),
+                    "e": _b64url_uint(numbers.e),
+                }
+            ]
+        }
+
+    def issue_token(
+        self,
+        issuer: str,
+        realm: str,
+        user: Dict[str, Any],
+        audience: Optional[str] = None,
+        lifetime: Optional[int] = None,
+    ) -> str:
+        now = int(time.time())
+        claims = {
+            "iss": issuer,
+            "sub": user["id"],
+            "aud": audience or self.client_id,
+            "azp": self.client_id,
+            "typ": "Bearer",
+            "iat": now,
+            "exp": now + (self.token_lifetime if lifetime is None else lifetime),
+            "jti": str(uuid.uuid4()),
+            "preferred_username": user["username"],
+            "email": user.get("email"),
+            "realm_access": {
+                "roles": list(self.role_mappings.get(realm, {}).get(user["id"], []))
+            },
+        }
+        return jwt.encode(
+            claims, self.private_key_pem, algorithm="RS256", headers={"kid": self.kid}
+        )
+
+    # ------------------------------------------------------------------
+    # HTTP surface
+    # ------------------------------------------------------------------
+    def _require_user(self, realm: str, user_id: str) -> Dict[str, Any]:
+        user = self.users.get(realm, {}).get(user_id)
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return user
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
+
+        @app.middleware("http")
+        async def _latency(request: Request, call_next):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if request.url.path.startswith("/admin/") and not request.headers.get(
+                "authorization", ""
+            ).lower().startswith("bearer "):
+                return Response(status_code=status.HTTP_401_UNAUTHORIZED)
+            return await call_next(request)
+
+        @app.post("/realms/{realm}/protocol/openid-connect/token")
+        async def token(realm: str, request: Request) -> Dict[str, Any]:
+            # Parsed by hand so the fake does not need python-multipart.
+            form = {k: v[0] for k, v in parse_qs((await request.body()).decode()).items()}
+            if form.get("grant_type") != "password":
+                raise HTTPException(status_code=400, detail="unsupported_grant_type")
+            user = self.find_user(realm, form.get("username", ""))
+            if user is None or self.passwords[realm][user["id"]] != form.get("password"):
+                raise HTTPException(status_code=401, detail="invalid_grant")
+            issuer = f"{str(request.base_url).rstrip('/')}/realms/{realm}"
+            return {
+                "access_token": self.issue_token(issuer, realm, user),
+                "expires_in": self.token_lifetime,
+                "token_type": "Bearer",
+            }
+
+        @app.get("/realms/{realm}/protocol/openid-connect/certs")
+        async def certs(realm: str) -> Dict[str, Any]:
+            return self.jwks
+
+        @app.get("/admin/realms/{realm}/users")
+        async def list_users(
+            realm: str, search: Optional[str] = None, max: int = 100
+        ) -> List[Dict[str, Any]]:
+            users = list(self.users.get(realm, {}).values())
+            if search:
+                users = [u for u in users if search.lower() in u["username"].lower()]
+            return users[:max]
+
+        @app.post("/admin/realms/{realm}/users")
+        async def create_user(
+            realm: str, request: Request, payload: Dict[str, Any] = Body(...)
+        ) -> Response:
+            if self.find_user(realm, payload.get("username", "")) is not None:
+                return Response(status_code=status.HTTP_409_CONFLICT)
+            credentials = payload.get("credentials") or [{}]
+            user = self.add_user(
+                realm,
+                payload["username"],
+                credentials[0].get("value", ""),
+                email=payload.get("email"),
+            )
+            user.update(
+                firstName=payload.get("firstName"), lastName=payload.get("lastName")
+            )
+            location = f"{str(request.url).rstrip('/')}/{user['id']}"
+            return Response(
+                status_code=status.HTTP_201_CREATED, headers={"Location": location}
+            )
+
+        @app.get("/admin/realms/{realm}/users/{user_id}")
+        async def get_user(realm: str, user_id: str) -> Dict[str, Any]:
+            return self._require_user(realm, user_id)
+
+        @app.get("/admin/realms/{realm}/roles")
+        async def list_roles(realm: str) -> List[Dict[str, Any]]:
+            return list(self.roles.get(realm, {}).values())
+
+        @app.get("/admin/realms/{realm}/roles/{role_name}")
+        async def get_role(realm: str, role_name: str) -> Dict[str, Any]:
+            role = self.roles.get(realm, {}).get(role_name)
+            if role is None:
+                raise HTTPException(status_code=404, detail="Could not find role")
+            return role
+
+        @app.get("/admin/realms/{realm}/users/{user_id}/role-mappings/realm")
+        async def get_role_mappings(realm: str, user_id: str) -> List[Dict[str, Any]]:
+            self._require_user(realm, user_id)
+            roles = self.roles.get(realm, {})
+            return [roles[name] for name in self.role_mappings[realm][user_id]]
+
+        @app.post(
+            "/admin/realms/{realm}/users/{user_id}/role-mappings/realm",
+            status_code=status.HTTP_204_NO_CONTENT,
+            response_class=Response,
+        )
+        async def add_role_mappings(
+            realm: str, user_id: str, payload: List[Dict[str, Any]] = Body(...)
+        ) -> Response:
+            self._require_user(realm, user_id)
+            mapped = self.role_mappings[realm][user_id]
+            for role in payload:
+                if role.get("name") not in self.roles.get(realm, {}):
+                    raise HTTPException(status_code=404, detail="Role not found")
+                if role["name"] not in mapped:
+                    mapped.append(role["name"])
+            return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+        @app.delete(
+            "/admin/realms/{realm}/users/{user_id}/role-mappings/realm",
+            status_code=status.HTTP_204_NO_CONTENT,
+            response_class=Response,
+        )
+        async def remove_role_mappings(
+            realm: str, user_id: str, payload: List[Dict[str, Any]] = Body(...)
+        ) -> Response:
+            self._require_user(realm, user_id)
+            names = {role.get("name") for role in payload}
+            self.role_mappings[realm][user_id] = [
+                name for name in self.role_mappings[realm][user_id] if name not in names
+            ]
+            return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+        return app
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def serve_in_thread(app: FastAPI, port: Optional[int] = None) -> Iterator[str]:
+    """Run ``app`` under uvicorn in a background thread and yield its base URL."""
+    port = port or free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline or not thread.is_alive():
+            raise RuntimeError("Fake Keycloak failed to start.")
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
@@ -0,0 +1,49 @@
+import io
+import json
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+
+from conf.logging_config import RequestLogSampler, setup_logging
+
+
+def test_sampler_always_keeps_errors_and_auth_decisions() -> None:
+    sampler = RequestLogSampler(default_rate=0.0, route_rates={"/me": 1.0})
+    assert sampler.should_log("/me", 200)
+    assert not sampler.should_log("/admin", 200)
+    assert sampler.should_log("/admin", 401)
+    assert sampler.should_log("/admin", 403)
+    assert sampler.should_log("/admin", 500)
+
+
+def test_setup_logging_writes_json_from_listener_thread() -> None:
+    stream = io.StringIO()
+    pipeline = setup_logging("INFO", stream=stream)
+    try:
+        logging.getLogger("app.test").info("hello", extra={"fields": {"request_id": "abc"}})
+    finally:
+        pipeline.shutdown()
+    # nothing is left feeding a queue that is no longer drained
+    assert pipeline.handler not in logging.getLogger().handlers
+    record = json.loads(stream.getvalue())
+    assert record["message"] == "hello"
+    assert record["request_id"] == "abc"
+    assert record["level"] == "INFO"
+    # per-call httpx INFO records would bypass request sampling
+    assert not logging.getLogger("httpx").isEnabledFor(logging.INFO)
+
+
+def test_requests_are_logged_with_request_id(
+    client: TestClient, caplog: pytest.LogCaptureFixture
+) -> None:
+    with caplog.at_level(logging.INFO, logger="app.request"):
+        response = client.get("/me", headers={"X-Request-ID": "req-1"})
+    assert response.status_code == 401
+    assert response.headers["x-request-id"] == "req-1"
+    (record,) = [r for r in caplog.records if r.name == "app.request"]
+    fields = record.fields
+    assert fields["request_id"] == "req-1"
+    assert fields["route"] == "/me"
+    assert fields["status"] == 401
+    assert fields["latency_ms"] >= 0
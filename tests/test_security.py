@@ -0,0 +1,317 @@
+import asyncio
+import base64
+import json
+import os
+import signal
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from app.core.config import Settings, TrustedIssuer, get_settings
+from app.core.security import (
+    IssuerKeyStore,
+    _get_key_stores,
+    _get_verify_executor,
+    get_token_rejections,
+)
+from tests.fake_keycloak import FakeKeycloak, free_port
+
+
+def test_me_returns_claims(client: TestClient, user_token: str) -> None:
+    response = client.get("/me", headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 200
+    assert response.json()["preferred_username"] == "alice"
+    assert response.json()["roles"] == ["client"]
+
+
+def test_me_rejects_missing_token(client: TestClient) -> None:
+    assert client.get("/me").status_code == 401
+
+
+def test_admin_requires_admin_role(
+    client: TestClient, admin_token: str, user_token: str
+) -> None:
+    assert client.get("/admin", headers={"Authorization": f"Bearer {admin_token}"}).status_code == 200
+    assert client.get("/admin", headers={"Authorization": f"Bearer {user_token}"}).status_code == 403
+
+
+def test_service_data_uses_basic_auth(client: TestClient) -> None:
+    response = client.get("/service-data", auth=("service-user", "service-pass"))
+    assert response.status_code == 200
+    assert client.get("/service-data", auth=("service-user", "nope")).status_code == 401
+
+
+def test_list_users_via_admin_client(client: TestClient, admin_token: str) -> None:
+    response = client.get(
+        "/api/v1/users", headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    assert {user["username"] for user in response.json()} >= {"admin", "alice"}
+
+
+def test_tokens_from_every_trusted_issuer_are_accepted(
+    client: TestClient,
+    fake_keycloak: FakeKeycloak,
+    keycloak_url: str,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv(
+        "KEYCLOAK_TRUSTED_ISSUERS",
+        json.dumps(
+            [
+                {"issuer": f"{keycloak_url}/realms/master"},
+                {"issuer": f"{keycloak_url}/realms/partners", "audience": "partner-api"},
+            ]
+        ),
+    )
+    get_settings.cache_clear()
+    _get_key_stores.cache_clear()
+    bob = fake_keycloak.find_user("partners", "bob") or fake_keycloak.add_user(
+        "partners", "bob", "bob-pass"
+    )
+
+    def me(issuer: str, audience: str | None = None) -> int:
+        token = fake_keycloak.issue_token(issuer, "partners", bob, audience=audience)
+        return client.get("/me", headers={"Authorization": f"Bearer {token}"}).status_code
+
+    assert me(f"{keycloak_url}/realms/partners", audience="partner-api") == 200
+    assert me(f"{keycloak_url}/realms/master") == 200
+    # audience is enforced per issuer
+    assert me(f"{keycloak_url}/realms/partners") == 401
+    assert me(f"{keycloak_url}/realms/unknown") == 401
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_verification_in_pool(
+    settings_env: None, user_token: str, monkeypatch: pytest.MonkeyPatch, mode: str
+) -> None:
+    from main import app
+
+    monkeypatch.setenv("TOKEN_VERIFY_EXECUTOR", mode)
+    monkeypatch.setenv("TOKEN_VERIFY_WORKERS", "1")
+    get_settings.cache_clear()
+    with TestClient(app) as client:
+        # workers are started by the lifespan, before the first request
+        executor = _get_verify_executor()
+        workers = executor._processes if mode == "process" else executor._threads
+        assert len(workers) == 1
+        ok = client.get("/me", headers={"Authorization": f"Bearer {user_token}"})
+        bad = client.get("/me", headers={"Authorization": f"Bearer {user_token}x"})
+    assert ok.status_code == 200
+    assert ok.json()["preferred_username"] == "alice"
+    assert bad.status_code == 401
+    assert bad.json()["detail"] == "Invalid token."
+
+
+def test_process_pool_is_replaced_after_a_child_dies(
+    settings_env: None, user_token: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from main import app
+
+    monkeypatch.setenv("TOKEN_VERIFY_EXECUTOR", "process")
+    monkeypatch.setenv("TOKEN_VERIFY_WORKERS", "1")
+    get_settings.cache_clear()
+    headers = {"Authorization": f"Bearer {user_token}"}
+    with TestClient(app) as client:
+        assert client.get("/me", headers=headers).status_code == 200
+        broken = _get_verify_executor()
+        for pid in list(broken._processes):
+            os.kill(pid, signal.SIGKILL)
+
+        assert client.get("/me", headers=headers).status_code == 200
+        assert client.get("/me", headers=headers).status_code == 200
+        assert _get_verify_executor() is not broken
+
+
+@pytest.mark.parametrize(
+    "name, value",
+    [
+        ("TOKEN_VERIFY_WORKERS", "0"),
+        ("TOKEN_MAX_BYTES", "-1"),
+        ("TOKEN_VERIFY_INLINE_MAX_BYTES", "-1"),
+        ("TOKEN_NEGATIVE_CACHE_TTL", "-1"),
+    ],
+)
+def test_invalid_token_settings_fail_at_load(
+    monkeypatch: pytest.MonkeyPatch, name: str, value: str
+) -> None:
+    monkeypatch.setenv(name, value)
+    with pytest.raises(ValidationError):
+        Settings()
+
+
+def test_cheap_rejections_are_counted_by_reason(
+    client: TestClient, fake_keycloak: FakeKeycloak, keycloak_url: str, admin_token: str
+) -> None:
+    alice = fake_keycloak.find_user("master", "alice")
+    expired = fake_keycloak.issue_token(
+        f"{keycloak_url}/realms/master", "master", alice, lifetime=-10
+    )
+    header, payload, _ = expired.split(".")
+    tokens = [
+        "x" * 10000,  # oversized
+        "not-a-jwt",  # malformed
+        "a.b.c",  # malformed
+        expired,  # expired
+        f"{header}.{payload}.AAAA",  # expired, signature never checked
+    ]
+    for token in tokens:
+        response = client.get("/me", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 401
+
+    body = client.get(
+        "/admin/token-rejections", headers={"Authorization": f"Bearer {admin_token}"}
+    ).json()
+    assert body["pid"] == os.getpid()
+    stats = body["counts"]
+    assert stats["oversized"] == 1
+    assert stats["malformed"] == 2
+    assert stats["expired"] == 2
+    assert stats["verified"] == 1  # only the admin token reached signature checks
+
+
+def test_expired_tokens_do_not_trigger_a_jwks_download(
+    client: TestClient, fake_keycloak: FakeKeycloak, keycloak_url: str
+) -> None:
+    issuer = f"{keycloak_url}/realms/master"
+    alice = fake_keycloak.find_user("master", "alice")
+    expired = fake_keycloak.issue_token(issuer, "master", alice, lifetime=-10)
+    response = client.get("/me", headers={"Authorization": f"Bearer {expired}"})
+    assert response.json()["detail"] == "Token expired."
+    assert _get_key_stores()[issuer]._fetched_at == float("-inf")
+
+
+def test_rejected_tokens_are_served_from_negative_cache(
+    client: TestClient, user_token: str
+) -> None:
+    forged = user_token[:-4] + ("AAAA" if not user_token.endswith("AAAA") else "BBBB")
+    for _ in range(3):
+        response = client.get("/me", headers={"Authorization": f"Bearer {forged}"})
+        assert response.status_code == 401
+        assert response.json()["detail"] == "Invalid token."
+
+    stats = get_token_rejections().snapshot()
+    assert stats["invalid"] == 1
+    assert stats["negative_cache"] == 2
+
+
+def test_non_string_iss_and_kid_are_rejected_as_malformed(
+    client: TestClient, fake_keycloak: FakeKeycloak, keycloak_url: str
+) -> None:
+    def b64(value: object) -> str:
+        return base64.urlsafe_b64encode(json.dumps(value).encode()).rstrip(b"=").decode()
+
+    issuer = f"{keycloak_url}/realms/master"
+    exp = int(time.time()) + 300
+    tokens = [
+        f"{b64({'alg': 'RS256', 'kid': fake_keycloak.kid})}.{b64({'iss': [issuer], 'exp': exp})}.AAAA",
+        f"{b64({'alg': 'RS256', 'kid': [fake_keycloak.kid]})}.{b64({'iss': issuer, 'exp': exp})}.AAAA",
+    ]
+    for token in tokens:
+        for _ in range(2):
+            response = client.get("/me", headers={"Authorization": f"Bearer {token}"})
+            assert response.status_code == 401
+            assert response.json()["detail"] == "Invalid token."
+
+    stats = get_token_rejections().snapshot()
+    assert stats["malformed"] == 2
+    assert stats["negative_cache"] == 2
+
+
+def test_unknown_kid_is_not_negatively_cached_and_bad_exp_is_malformed(
+    client: TestClient, fake_keycloak: FakeKeycloak, keycloak_url: str
+) -> None:
+    alice = fake_keycloak.find_user("master", "alice")
+    token = fake_keycloak.issue_token(f"{keycloak_url}/realms/master", "master", alice)
+    header, payload, signature = token.split(".")
+    claims = json.loads(base64.urlsafe_b64decode(payload + "=="))
+
+    def b64(value: object) -> str:
+        return base64.urlsafe_b64encode(json.dumps(value).encode()).rstrip(b"=").decode()
+
+    unknown_kid = f"{b64({'alg': 'RS256', 'kid': 'rotated'})}.{payload}.{signature}"
+    no_exp = f"{header}.{b64({k: v for k, v in claims.items() if k != 'exp'})}.{signature}"
+    for _ in range(2):
+        assert client.get("/me", headers={"Authorization": f"Bearer {unknown_kid}"}).status_code == 401
+    response = client.get("/me", headers={"Authorization": f"Bearer {no_exp}"})
+    assert response.json()["detail"] == "Invalid token."
+
+    stats = get_token_rejections().snapshot()
+    assert stats["unknown_kid"] == 2
+    assert stats["malformed"] == 1
+    assert "negative_cache" not in stats
+    assert "expired" not in stats
+
+
+def test_key_store_survives_keycloak_outage(
+    fake_keycloak: FakeKeycloak, keycloak_url: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    dead_url = f"http://127.0.0.1:{free_port()}/certs"
+    store = IssuerKeyStore(
+        TrustedIssuer(
+            issuer=f"{keycloak_url}/realms/master",
+            jwks_url=f"{keycloak_url}/realms/master/protocol/openid-connect/certs",
+        ),
+        cache_ttl=0,
+    )
+    asyncio.run(store.refresh_if_stale())
+    assert store.get_key(fake_keycloak.kid) is not None
+
+    fetches = []
+    real_refresh = store._refresh
+
+    async def counting_refresh() -> None:
+        fetches.append(1)
+        await real_refresh()
+
+    monkeypatch.setattr(store, "_refresh", counting_refresh)
+    store.jwks_url = dead_url
+    # last good keys keep being served, and the dead endpoint is not retried
+    # on every call
+    for _ in range(2):
+        asyncio.run(store.refresh_if_stale())
+        assert store.get_key(fake_keycloak.kid) is not None
+    assert len(fetches) == 1
+
+    never_fetched = IssuerKeyStore(
+        TrustedIssuer(issuer="http://kc/realms/x", jwks_url=dead_url), cache_ttl=0
+    )
+    for _ in range(2):
+        asyncio.run(never_fetched.refresh_if_stale())
+        with pytest.raises(HTTPException) as exc_info:
+            never_fetched.get_key("any")
+        assert exc_info.value.status_code == 503
+
+
+def test_jwks_refresh_does_not_block_the_event_loop(
+    fake_keycloak: FakeKeycloak, keycloak_url: str
+) -> None:
+    store = IssuerKeyStore(
+        TrustedIssuer(
+            issuer=f"{keycloak_url}/realms/master",
+            jwks_url=f"{keycloak_url}/realms/master/protocol/openid-connect/certs",
+        ),
+        cache_ttl=300,
+    )
+
+    async def scenario() -> float:
+        await store.refresh_if_stale()
+        store._fetched_at = float("-inf")  # stale, keys still cached
+        fake_keycloak.latency = 0.5
+        try:
+            refresh = asyncio.create_task(store.refresh_if_stale())
+            await asyncio.sleep(0)
+            started = time.perf_counter()
+            # a concurrent request keeps using the cached keys meanwhile
+            await store.refresh_if_stale()
+            assert store.get_key(fake_keycloak.kid) is not None
+            waited = time.perf_counter() - started
+            await refresh
+            return waited
+        finally:
+            fake_keycloak.latency = 0.0
+
+    assert asyncio.run(scenario()) < 0.1
@@ -0,0 +1,155 @@
+import asyncio
+import uuid
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.services.keycloak_admin import KeycloakAdminClient
+from tests.fake_keycloak import FakeKeycloak
+
+REALM = "master"
+
+
+def test_reconcile_role_mappings(
+    client: TestClient, fake_keycloak: FakeKeycloak, admin_token: str
+) -> None:
+    fake_keycloak.add_role(REALM, "auditor")
+    fake_keycloak.add_role(REALM, "default-roles-master")
+    carol = fake_keycloak.add_user(
+        REALM, "carol", "carol-pass", roles=["client", "default-roles-master"]
+    )
+    dave = fake_keycloak.add_user(REALM, "dave", "dave-pass", roles=["auditor"])
+    missing = str(uuid.uuid4())
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    body = {
+        "desired": {
+            carol["id"]: ["auditor"],
+            dave["id"]: ["auditor"],
+            missing: ["client"],
+        },
+        "managed_roles": ["client", "auditor"],
+    }
+
+    plan = client.post(
+        "/api/v1/users/role-mappings/reconcile", json={**body, "dry_run": True}, headers=headers
+    )
+    assert plan.status_code == 200
+    results = {r["user_id"]: r for r in plan.json()["results"]}
+    assert results[carol["id"]]["status"] == "planned"
+    assert results[carol["id"]]["added"] == ["auditor"]
+    assert results[carol["id"]]["removed"] == ["client"]
+    assert results[dave["id"]]["status"] == "unchanged"
+    assert results[missing]["error"] == "Keycloak user not found."
+    assert fake_keycloak.role_mappings[REALM][carol["id"]] == ["client", "default-roles-master"]
+
+    applied = client.post("/api/v1/users/role-mappings/reconcile", json=body, headers=headers)
+    assert applied.status_code == 200
+    results = {r["user_id"]: r for r in applied.json()["results"]}
+    assert results[carol["id"]]["status"] == "applied"
+    # roles outside managed_roles are left alone
+    assert sorted(fake_keycloak.role_mappings[REALM][carol["id"]]) == [
+        "auditor",
+        "default-roles-master",
+    ]
+
+
+def test_reconcile_rejects_unknown_roles(
+    client: TestClient, fake_keycloak: FakeKeycloak, admin_token: str
+) -> None:
+    erin = fake_keycloak.add_user(REALM, "erin", "erin-pass")
+    response = client.post(
+        "/api/v1/users/role-mappings/reconcile",
+        json={"desired": {erin["id"]: ["no-such-role"]}},
+        headers={"Authorization": f"Bearer {admin_token}"},
+    )
+    (result,) = response.json()["results"]
+    assert result["status"] == "error"
+    assert "no-such-role" in result["error"]
+    assert fake_keycloak.role_mappings[REALM][erin["id"]] == []
+
+
+def test_reconcile_never_adds_roles_outside_managed_roles(
+    client: TestClient, fake_keycloak: FakeKeycloak, admin_token: str
+) -> None:
+    frank = fake_keycloak.add_user(REALM, "frank", "frank-pass", roles=["client"])
+    response = client.post(
+        "/api/v1/users/role-mappings/reconcile",
+        json={"desired": {frank["id"]: ["admin"]}, "managed_roles": ["client"]},
+        headers={"Authorization": f"Bearer {admin_token}"},
+    )
+    (result,) = response.json()["results"]
+    assert result["status"] == "error"
+    assert "admin" in result["error"]
+    assert fake_keycloak.role_mappings[REALM][frank["id"]] == ["client"]
+
+
+def test_reconcile_rejects_user_ids_that_are_not_uuids(
+    client: TestClient, fake_keycloak: FakeKeycloak, admin_token: str
+) -> None:
+    admin = fake_keycloak.find_user(REALM, "admin")
+    path_tricks = [
+        "x/../../roles/admin/composites#",
+        "x/../../../groups/g1",
+        "..",
+        f"{admin['id']}/../{admin['id']}",
+    ]
+    response = client.post(
+        "/api/v1/users/role-mappings/reconcile",
+        json={"desired": {user_id: ["client"] for user_id in path_tricks}},
+        headers={"Authorization": f"Bearer {admin_token}"},
+    )
+    assert response.status_code == 200
+    for result in response.json()["results"]:
+        assert result["status"] == "error"
+        assert result["error"] == "Invalid Keycloak user ID."
+    assert fake_keycloak.role_mappings[REALM][admin["id"]] == ["admin"]
+
+
+def test_reconcile_reports_transport_errors_per_user(
+    settings_env: None, fake_keycloak: FakeKeycloak, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    gina = fake_keycloak.add_user(REALM, "gina", "gina-pass")
+    hank = fake_keycloak.add_user(REALM, "hank", "hank-pass")
+    kc = KeycloakAdminClient()
+    real_read = kc._get_user_realm_roles
+
+    async def flaky_read(client, token, user_id):
+        if user_id == gina["id"]:
+            raise httpx.ConnectTimeout("timed out")
+        return await real_read(client, token, user_id)
+
+    monkeypatch.setattr(kc, "_get_user_realm_roles", flaky_read)
+    results = asyncio.run(
+        kc.reconcile_realm_roles({gina["id"]: ["client"], hank["id"]: ["client"]})
+    )
+    by_user = {r["user_id"]: r for r in results}
+    assert by_user[gina["id"]]["status"] == "error"
+    assert "ConnectTimeout" in by_user[gina["id"]]["error"]
+    assert by_user[hank["id"]]["status"] == "applied"
+    assert fake_keycloak.role_mappings[REALM][hank["id"]] == ["client"]
+
+
+def test_reconcile_reports_partially_applied_changes(
+    settings_env: None, fake_keycloak: FakeKeycloak, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    fake_keycloak.add_role(REALM, "auditor")
+    ivan = fake_keycloak.add_user(REALM, "ivan", "ivan-pass", roles=["client"])
+    kc = KeycloakAdminClient()
+    real_change = kc._change_user_realm_roles
+
+    async def failing_delete(client, token, user_id, roles, method):
+        if method == "DELETE":
+            raise HTTPException(status_code=502, detail="Failed to remove realm roles.")
+        await real_change(client, token, user_id, roles, method)
+
+    monkeypatch.setattr(kc, "_change_user_realm_roles", failing_delete)
+    (result,) = asyncio.run(
+        kc.reconcile_realm_roles({ivan["id"]: ["auditor"]}, managed_roles=["client", "auditor"])
+    )
+    assert result["status"] == "partial"
+    assert result["added"] == ["auditor"]
+    assert result["removed"] == []
+    assert result["error"] == "Failed to remove realm roles."
+    assert sorted(fake_keycloak.role_mappings[REALM][ivan["id"]]) == ["auditor", "client"]